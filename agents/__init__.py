@@ -15,6 +15,12 @@ Agents:
 __version__ = "1.0.0"
 __author__ = "Medical Doc AI Team"
 
+import google.generativeai as genai
+import config
+
+# Configure Gemini once for every agent
+genai.configure(api_key=config.GOOGLE_API_KEY)
+
 from .orchestrator import OrchestratorAgent
 from .document_loader import DocumentLoaderAgent
 from .qa_agent import QAAgent
@@ -3,25 +3,31 @@ Document Loader Agent - Handles multi-format document ingestion
 """
 import os
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, NamedTuple, Tuple
 from loguru import logger
-import sys
-sys.path.append(str(Path(__file__).parent.parent))
 
 from utils.document_processor import DocumentProcessor
-from utils.vector_store import VectorStore
+from utils.vector_store import get_vector_store
 import config
 
 
+class LoadResult(NamedTuple):
+    """Outcome of loading a batch of documents"""
+    success: List[str]
+    failed: List[Dict[str, str]]
+    total_chunks: int
+    processed_docs: List[Dict[str, Any]]
+
+
 class DocumentLoaderAgent:
     """Agent responsible for loading and processing documents"""
     
     def __init__(self):
         self.processor = DocumentProcessor()
-        self.vector_store = VectorStore()
+        self.vector_store = get_vector_store()
         logger.info("Document Loader Agent initialized")
     
-    def load_documents(self, file_paths: List[str]) -> Dict[str, Any]:
+    def load_documents(self, file_paths: List[str]) -> LoadResult:
         """
         Load and process multiple documents
         
@@ -31,56 +37,94 @@ class DocumentLoaderAgent:
         Returns:
             Processing results including success/failure status
         """
-        results = {
-            'success': [],
-            'failed': [],
-            'total_chunks': 0,
-            'processed_docs': []
-        }
+        parsed = []
+        failed = []
         
-        for file_path in file_paths:
-            try:
-                logger.info(f"Processing document: {file_path}")
-                
-                # Process the document
-                processed = self.processor.process_document(file_path)
-                
-                # Extract all text
-                full_text = self.processor.extract_all_text(processed)
-                
-                # Prepare for vector store
-                doc_data = {
-                    'text': full_text,
-                    'filename': Path(file_path).name,
-                    'source': 'uploaded',
-                    'doc_type': 'medical',
-                    'metadata': processed['metadata']
-                }
-                
-                # Add to vector store
-                chunk_ids = self.vector_store.add_documents([doc_data])
-                
-                results['success'].append(file_path)
-                results['total_chunks'] += len(chunk_ids)
-                results['processed_docs'].append({
-                    'filename': Path(file_path).name,
-                    'chunks': len(chunk_ids),
-                    'has_tables': len(processed.get('tables', [])) > 0,
-                    'has_images': len(processed.get('images', [])) > 0,
-                    'metadata': processed['metadata']
-                })
-                
-                logger.info(f"Successfully processed: {file_path}")
-                
-            except Exception as e:
-                logger.error(f"Failed to process {file_path}: {e}")
-                results['failed'].append({
+        # Pass 1: parse documents concurrently in the shared worker process pool
+        if file_paths:
+            for file_path, outcome in self.processor.process_documents(file_paths).items():
+                if isinstance(outcome, Exception):
+                    failed.append({
+                        'file': file_path,
+                        'error': str(outcome)
+                    })
+                else:
+                    parsed.append((file_path, outcome))
+        
+        # Pass 2: embed and store
+        return self.index_processed(parsed, failed)
+    
+    def index_processed(
+        self,
+        processed_docs: List[Tuple[str, Dict[str, Any]]],
+        failed: List[Dict[str, str]] = None,
+        doc_ids: Dict[str, str] = None,
+        filenames: Dict[str, str] = None
+    ) -> LoadResult:
+        """
+        Embed and store documents that have already been parsed
+        
+        Args:
+            processed_docs: (file path, DocumentProcessor output) pairs
+            failed: Files that failed earlier, reported alongside the results
+            doc_ids: Stable ids (e.g. content hashes) by file path; re-indexing
+                a document with the same id overwrites its chunks
+            filenames: Original filenames by file path, for files stored under
+                another name (e.g. their content hash); defaults to the path's name
+            
+        Returns:
+            Processing results including success/failure status
+        """
+        success = []
+        failed = list(failed or [])
+        total_chunks = 0
+        doc_summaries = []
+        
+        if not processed_docs:
+            logger.info(f"Document loading complete. Success: 0, Failed: {len(failed)}")
+            return LoadResult(success, failed, total_chunks, doc_summaries)
+        
+        doc_data_list = []
+        for file_path, processed in processed_docs:
+            filename = (filenames or {}).get(file_path) or Path(file_path).name
+            doc_data_list.append({
+                'chunks': self.processor.extract_all_text(processed, structured=True),
+                'filename': filename,
+                'source': 'uploaded',
+                'doc_type': 'medical',
+                'doc_id': (doc_ids or {}).get(file_path),
+                # Parser metadata records the on-disk name; report the original one
+                'metadata': {**processed['metadata'], 'filename': filename}
+            })
+        
+        # Embed and store every document's chunks in one batch
+        try:
+            batch = self.vector_store.add_document_batch(doc_data_list)
+        except Exception as e:
+            logger.error(f"Failed to index documents: {e}")
+            for file_path, _ in processed_docs:
+                failed.append({
                     'file': file_path,
                     'error': str(e)
                 })
+            return LoadResult(success, failed, total_chunks, doc_summaries)
+        
+        for (file_path, processed), doc_data, chunk_ids, duplicates in zip(
+            processed_docs, doc_data_list, batch.chunk_ids, batch.duplicate_chunks
+        ):
+            success.append(file_path)
+            total_chunks += len(chunk_ids)
+            doc_summaries.append({
+                'filename': doc_data['filename'],
+                'chunks': len(chunk_ids),
+                'duplicate_chunks': duplicates,
+                'has_tables': len(processed.get('tables', [])) > 0,
+                'has_images': len(processed.get('images', [])) > 0,
+                'metadata': processed['metadata']
+            })
         
-        logger.info(f"Document loading complete. Success: {len(results['success'])}, Failed: {len(results['failed'])}")
-        return results
+        logger.info(f"Document loading complete. Success: {len(success)}, Failed: {len(failed)}")
+        return LoadResult(success, failed, total_chunks, doc_summaries)
     
     def get_document_stats(self) -> Dict[str, Any]:
         """Get statistics about loaded documents"""
@@ -1,15 +1,13 @@
 """
 Extraction Agent - Extracts specific data, tables, and images from documents
 """
-import time
+from functools import cached_property
 from typing import List, Dict, Any
-from pathlib import Path
-import sys
-sys.path.append(str(Path(__file__).parent.parent))
 
-import google.generativeai as genai
 from utils.document_processor import DocumentProcessor
-from utils.vector_store import VectorStore
+from utils.vector_store import get_vector_store, unique_contents
+from utils.cached_vector_store import CachedVectorStore
+from utils.gemini import get_model
 from loguru import logger
 import config
 
@@ -18,18 +16,18 @@ class ExtractionAgent:
     """Agent for extracting specific content from documents"""
     
     def __init__(self):
-        # Configure Gemini
-        genai.configure(api_key=config.GOOGLE_API_KEY)
-        
-        self.model = genai.GenerativeModel(
-            model_name=config.GEMINI_MODEL
-        )
+        self._generation_config = "default"
         
         self.processor = DocumentProcessor()
-        self.vector_store = VectorStore()
+        self.vector_store = CachedVectorStore(get_vector_store())
         
         logger.info("Extraction Agent initialized")
     
+    @cached_property
+    def model(self):
+        """Gemini model, built on first use"""
+        return get_model(config.GEMINI_MODEL, self._generation_config)
+    
     def extract_section(self, section_name: str) -> Dict[str, Any]:
         """
         Extract a specific section from documents
@@ -41,8 +39,6 @@ class ExtractionAgent:
             Extracted content
         """
         try:
-            time.sleep(config.REQUEST_DELAY_SECONDS)
-            
             # Search for section
             results = self.vector_store.similarity_search(
                 query=f"Extract {section_name} section",
@@ -56,10 +52,8 @@ class ExtractionAgent:
                     'found': False
                 }
             
-            # Combine relevant content
-            content_parts = []
-            for result in results:
-                content_parts.append(result['content'])
+            # Combine relevant content, skipping repeated chunks
+            content_parts = [result['content'] for result in unique_contents(results)]
             
             combined_content = '\n\n'.join(content_parts)
             
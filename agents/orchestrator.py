@@ -1,40 +1,49 @@
 """
 Orchestrator Agent - Central controller that coordinates all agents
 """
-import time
-from typing import Dict, Any, List
+import string
+from functools import cached_property
+from typing import Dict, Any, Iterator, List, Tuple, Union
 from loguru import logger
-from pathlib import Path
-import sys
-sys.path.append(str(Path(__file__).parent.parent))
 
-import google.generativeai as genai
-from .document_loader import DocumentLoaderAgent
+from .document_loader import DocumentLoaderAgent, LoadResult
 from .qa_agent import QAAgent
+from utils.gemini import get_model
 import config
 
 
 class OrchestratorAgent:
     """Central agent that orchestrates workflow between specialized agents"""
     
+    # Words and phrases that route a request to collection statistics
+    _STATS_TOKENS = frozenset({'stats', 'statistics', 'count', 'loaded'})
+    _STATS_PHRASE = 'how many'
+    _PUNCTUATION_TO_SPACE = str.maketrans(string.punctuation, ' ' * len(string.punctuation))
+    
     def __init__(self):
-        # Configure Gemini
-        genai.configure(api_key=config.GOOGLE_API_KEY)
-        
-        # Initialize model for function calling
-        self.model = genai.GenerativeModel(
-            model_name=config.GEMINI_MODEL
-        )
-        
-        # Initialize specialized agents
-        self.document_loader = DocumentLoaderAgent()
-        self.qa_agent = QAAgent()
+        # Model for function calling is created on first use
+        self._generation_config = "default"
         
         # Define available tools/functions
         self.tools = self._define_tools()
         
         logger.info("Orchestrator Agent initialized")
     
+    @cached_property
+    def model(self):
+        """Gemini model, built on first use"""
+        return get_model(config.GEMINI_MODEL, self._generation_config)
+    
+    @cached_property
+    def document_loader(self) -> DocumentLoaderAgent:
+        """Document loader agent, created on first use"""
+        return DocumentLoaderAgent()
+    
+    @cached_property
+    def qa_agent(self) -> QAAgent:
+        """Q&A agent, created on first use"""
+        return QAAgent()
+    
     def _define_tools(self) -> List[Dict]:
         """Define available tools for function calling"""
         return [
@@ -78,8 +87,6 @@ class OrchestratorAgent:
             Response dictionary
         """
         try:
-            time.sleep(config.REQUEST_DELAY_SECONDS)
-            
             # Determine intent
             intent = self._determine_intent(user_input)
             
@@ -121,21 +128,93 @@ class OrchestratorAgent:
                 'success': False
             }
     
+    def process_request_stream(
+        self,
+        user_input: str,
+        chat_history: List[Dict[str, str]] = None
+    ) -> Iterator[Union[str, Dict[str, Any]]]:
+        """
+        Process user request, streaming text as it becomes available
+        
+        Args:
+            user_input: User's message
+            chat_history: Previous conversation
+            
+        Yields:
+            Response text chunks, then the final response dictionary
+            (same shape as process_request)
+        """
+        try:
+            intent = self._determine_intent(user_input)
+            
+            if intent != 'qa':
+                # Non-Q&A responses are produced in one piece
+                response = self.process_request(user_input, chat_history)
+                yield response['content']
+                yield response
+                return
+            
+            for item in self.qa_agent.answer_question_stream(
+                question=user_input,
+                chat_history=chat_history
+            ):
+                if isinstance(item, dict):
+                    yield {
+                        'type': 'qa',
+                        'content': item['answer'],
+                        'sources': item.get('sources', []),
+                        'success': True
+                    }
+                else:
+                    yield item
+                    
+        except Exception as e:
+            logger.error(f"Error in orchestrator: {e}")
+            error_content = f"An error occurred: {str(e)}"
+            yield error_content
+            yield {
+                'type': 'error',
+                'content': error_content,
+                'success': False
+            }
+    
     def _determine_intent(self, user_input: str) -> str:
         """Determine user intent from input"""
         user_input_lower = user_input.lower()
         
         # Check for statistics requests
-        if any(word in user_input_lower for word in ['how many', 'stats', 'statistics', 'count', 'loaded']):
+        tokens = set(user_input_lower.translate(self._PUNCTUATION_TO_SPACE).split())
+        if tokens & self._STATS_TOKENS or self._STATS_PHRASE in user_input_lower:
             return 'stats'
         
         # Default to Q&A
         return 'qa'
     
-    def load_documents(self, file_paths: List[str]) -> Dict[str, Any]:
+    def load_documents(self, file_paths: List[str]) -> LoadResult:
         """Load documents using document loader agent"""
-        return self.document_loader.load_documents(file_paths)
+        results = self.document_loader.load_documents(file_paths)
+        # New documents can change answers to previously asked questions
+        self._clear_answer_cache()
+        return results
+    
+    def index_processed(
+        self,
+        processed_docs: List[Tuple[str, Dict[str, Any]]],
+        failed: List[Dict[str, str]] = None,
+        doc_ids: Dict[str, str] = None,
+        filenames: Dict[str, str] = None
+    ) -> LoadResult:
+        """Store documents that were already parsed (e.g. in worker processes)"""
+        results = self.document_loader.index_processed(processed_docs, failed, doc_ids, filenames)
+        self._clear_answer_cache()
+        return results
     
     def clear_documents(self):
         """Clear all loaded documents"""
         self.document_loader.clear_all_documents()
+        self._clear_answer_cache()
+    
+    def _clear_answer_cache(self):
+        """Clear cached Q&A answers, if the Q&A agent has been created"""
+        if 'qa_agent' in self.__dict__:
+            self.qa_agent.clear_cache()
@@ -1,44 +1,70 @@
 """
 Q&A Agent - Handles retrieval-augmented generation for conversational Q&A
 """
-import time
-from typing import List, Dict, Any
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import cached_property
+from typing import List, Dict, Any, Iterator, Optional, Union
 from loguru import logger
-from pathlib import Path
-import sys
-sys.path.append(str(Path(__file__).parent.parent))
 
-import google.generativeai as genai
-from utils.vector_store import VectorStore
+from utils.vector_store import VectorStore, get_vector_store, unique_contents
+from utils.cached_vector_store import CachedVectorStore
+from utils.rate_limiter import gemini_bucket
+from utils.gemini import get_model
 import config
 
 
+NO_RESULTS_ANSWER = (
+    "I couldn't find relevant information in the uploaded documents to answer your question. "
+    "Please make sure you've uploaded the necessary medical documents."
+)
+
+
+RAG_TEMPLATE = """You are a helpful medical document assistant. Answer the user's question based on the provided context from uploaded medical documents.
+
+Instructions:
+- Use ONLY information from the provided context to answer the question
+- If the context doesn't contain enough information, say so clearly
+- Give detailed answer and cite specific details from the documents
+- Maintain a professional medical tone
+- If previous conversation history is provided, maintain context continuity
+
+Previous Conversation:
+{history}
+
+Context from Documents:
+{context}
+
+User Question: {question}
+
+Answer:"""
+
+
 class QAAgent:
     """Agent for question answering using RAG"""
     
     def __init__(self):
-        # Configure Google Gemini
-        genai.configure(api_key=config.GOOGLE_API_KEY)
-        
-        # Initialize model
-        self.model = genai.GenerativeModel(
-            model_name=config.GEMINI_MODEL,
-            generation_config={
-                "temperature": 0.7,
-                "top_p": 0.95,
-                "top_k": 40,
-                "max_output_tokens": config.MAX_OUTPUT_TOKENS,
-            }
-        )
+        # Model (shared across agents) is created on first use
+        self._generation_config = "qa"
         
         # Initialize vector store
-        self.vector_store = VectorStore()
+        self.vector_store = CachedVectorStore(get_vector_store())
         
         # Chat history
         self.chat_history = []
         
+        # Answer cache for repeated questions (LRU)
+        self._answer_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        
         logger.info("Q&A Agent initialized")
     
+    @cached_property
+    def model(self):
+        """Gemini model, built on first use"""
+        return get_model(config.GEMINI_MODEL, self._generation_config)
+    
     def answer_question(
         self,
         question: str,
@@ -55,8 +81,15 @@ class QAAgent:
             Dictionary with answer and sources
         """
         try:
-            # Rate limiting
-            time.sleep(config.REQUEST_DELAY_SECONDS)
+            # Serve repeated questions from cache
+            cache_key = self._cache_key(question, chat_history)
+            cached = self._get_cached_answer(cache_key)
+            if cached is not None:
+                logger.info("Question answered from cache")
+                return cached
+            
+            # Answers built on a collection that changes meanwhile must not be cached
+            generation = VectorStore.generation
             
             # Retrieve relevant documents
             relevant_docs = self.vector_store.similarity_search(
@@ -66,23 +99,16 @@ class QAAgent:
             
             if not relevant_docs:
                 return {
-                    'answer': "I couldn't find relevant information in the uploaded documents to answer your question. Please make sure you've uploaded the necessary medical documents.",
+                    'answer': NO_RESULTS_ANSWER,
                     'sources': [],
                     'confidence': 'low'
                 }
             
-            # Build context from retrieved documents
-            context = self._build_context(relevant_docs)
-            
-            # Build chat history context
-            history_context = ""
-            if chat_history:
-                history_context = self._build_history_context(chat_history[-5:])  # Last 5 turns
-            
             # Create prompt
-            prompt = self._create_rag_prompt(question, context, history_context)
+            prompt = self._build_prompt(question, relevant_docs, chat_history)
             
-            # Generate answer
+            # Generate answer (rate limited)
+            gemini_bucket.acquire()
             response = self.model.generate_content(prompt)
             answer = response.text
             
@@ -91,11 +117,14 @@ class QAAgent:
             
             logger.info(f"Question answered successfully")
             
-            return {
+            result = {
                 'answer': answer,
                 'sources': sources,
                 'confidence': 'high' if len(relevant_docs) >= 3 else 'medium'
             }
+            self._store_cached_answer(cache_key, result, generation)
+            
+            return result
             
         except Exception as e:
             logger.error(f"Error answering question: {e}")
@@ -105,11 +134,141 @@ class QAAgent:
                 'confidence': 'low'
             }
     
+    def answer_question_stream(
+        self,
+        question: str,
+        chat_history: List[Dict[str, str]] = None
+    ) -> Iterator[Union[str, Dict[str, Any]]]:
+        """
+        Answer a question using RAG pipeline, streaming the answer as it is generated
+        
+        Args:
+            question: User's question
+            chat_history: Previous conversation history
+            
+        Yields:
+            Answer text chunks, then a final dictionary with the full answer and sources
+        """
+        try:
+            # Serve repeated questions from cache
+            cache_key = self._cache_key(question, chat_history)
+            cached = self._get_cached_answer(cache_key)
+            if cached is not None:
+                logger.info("Question answered from cache")
+                yield cached['answer']
+                yield cached
+                return
+            
+            # Answers built on a collection that changes meanwhile must not be cached
+            generation = VectorStore.generation
+            
+            # Retrieve relevant documents
+            relevant_docs = self.vector_store.similarity_search(
+                query=question,
+                k=config.TOP_K_RESULTS
+            )
+            
+            if not relevant_docs:
+                yield NO_RESULTS_ANSWER
+                yield {
+                    'answer': NO_RESULTS_ANSWER,
+                    'sources': [],
+                    'confidence': 'low'
+                }
+                return
+            
+            # Create prompt
+            prompt = self._build_prompt(question, relevant_docs, chat_history)
+            
+            # Stream answer (rate limited)
+            gemini_bucket.acquire()
+            answer_parts = []
+            for chunk in self.model.generate_content(prompt, stream=True):
+                if not chunk.parts:
+                    continue
+                answer_parts.append(chunk.text)
+                yield chunk.text
+            
+            logger.info("Question answered successfully")
+            
+            result = {
+                'answer': ''.join(answer_parts),
+                'sources': self._extract_sources(relevant_docs),
+                'confidence': 'high' if len(relevant_docs) >= 3 else 'medium'
+            }
+            self._store_cached_answer(cache_key, result, generation)
+            
+            yield result
+            
+        except Exception as e:
+            logger.error(f"Error answering question: {e}")
+            error_answer = f"I encountered an error while processing your question: {str(e)}"
+            yield error_answer
+            yield {
+                'answer': error_answer,
+                'sources': [],
+                'confidence': 'low'
+            }
+    
+    def clear_cache(self):
+        """Clear cached answers (e.g. after the document set changes)"""
+        with self._cache_lock:
+            self._answer_cache.clear()
+    
+    def _cache_key(
+        self,
+        question: str,
+        chat_history: Optional[List[Dict[str, str]]] = None
+    ) -> str:
+        """Build cache key from the question and the history turns used in the prompt"""
+        history_key = "|".join(
+            f"{turn.get('role', 'user')}:{turn.get('content', '')}" for turn in chat_history or []
+        )
+        return hashlib.sha256(f"{question}\0{history_key}".encode('utf-8')).hexdigest()
+    
+    def _get_cached_answer(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached answer, marking it as recently used"""
+        with self._cache_lock:
+            cached = self._answer_cache.get(key)
+            if cached is None:
+                return None
+            self._answer_cache.move_to_end(key)
+            return dict(cached)
+    
+    def _store_cached_answer(self, key: str, result: Dict[str, Any], generation: int):
+        """Store an answer, evicting the least recently used entry when full"""
+        with self._cache_lock:
+            # The documents changed (and the cache was cleared) while this answer was built
+            if generation != VectorStore.generation:
+                return
+            self._answer_cache[key] = dict(result)
+            self._answer_cache.move_to_end(key)
+            while len(self._answer_cache) > config.QA_CACHE_SIZE:
+                self._answer_cache.popitem(last=False)
+    
+    def _build_prompt(
+        self,
+        question: str,
+        relevant_docs: List[Dict[str, Any]],
+        chat_history: Optional[List[Dict[str, str]]] = None
+    ) -> str:
+        """Build the full RAG prompt from retrieved documents and the given history"""
+        # Build context from retrieved documents
+        context = self._build_context(relevant_docs)
+        
+        # Build chat history context (callers bound the history they pass)
+        history_context = ""
+        if chat_history:
+            history_context = self._build_history_context(chat_history)
+        
+        return self._create_rag_prompt(question, context, history_context)
+    
     def _build_context(self, documents: List[Dict[str, Any]]) -> str:
         """Build context from retrieved documents"""
         context_parts = []
         
-        for i, doc in enumerate(documents, 1):
+        # Repeated chunks would only spend prompt tokens
+        for i, doc in enumerate(unique_contents(documents), 1):
             content = doc['content']
             source = doc['metadata'].get('filename', 'Unknown')
             context_parts.append(f"[Source {i}: {source}]\n{content}\n")
@@ -138,27 +297,11 @@ class QAAgent:
         history: str = ""
     ) -> str:
         """Create RAG prompt"""
-        
-        prompt = f"""You are a helpful medical document assistant. Answer the user's question based on the provided context from uploaded medical documents.
-
-Instructions:
-- Use ONLY information from the provided context to answer the question
-- If the context doesn't contain enough information, say so clearly
-- Give detailed answer and cite specific details from the documents
-- Maintain a professional medical tone
-- If previous conversation history is provided, maintain context continuity
-
-Previous Conversation:
-{history if history else "No previous conversation"}
-
-Context from Documents:
-{context}
-
-User Question: {question}
-
-Answer:"""
-        
-        return prompt
+        return RAG_TEMPLATE.format_map({
+            "history": history or "No previous conversation",
+            "context": context,
+            "question": question,
+        })
     
     def _extract_sources(self, documents: List[Dict[str, Any]]) -> List[Dict[str, str]]:
         """Extract source information"""
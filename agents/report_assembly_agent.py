@@ -2,40 +2,50 @@
 Report Assembly Agent - Assembles structured reports from extracted content
 """
 import time
-from typing import List, Dict, Any
-from pathlib import Path
-import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from typing import List, Dict, Any, TYPE_CHECKING
 import os
-sys.path.append(str(Path(__file__).parent.parent))
 
-import google.generativeai as genai
 from .extraction_agent import ExtractionAgent
 from .summarization_agent import SummarizationAgent
-from utils.pdf_generator import PDFReportGenerator
+from utils.gemini import get_model
 from loguru import logger
 import config
 
+if TYPE_CHECKING:
+    from utils.pdf_generator import PDFReportGenerator
+
 
 class ReportAssemblyAgent:
     """Agent for assembling and generating reports"""
     
     def __init__(self):
-        # Configure Gemini
-        genai.configure(api_key=config.GOOGLE_API_KEY)
-        
-        self.model = genai.GenerativeModel(
-            model_name=config.GEMINI_MODEL
-        )
-        
-        # Initialize sub-agents
-        self.extraction_agent = ExtractionAgent()
-        self.summarization_agent = SummarizationAgent()
-        
-        # PDF generator
-        self.pdf_generator = PDFReportGenerator()
+        self._generation_config = "default"
         
         logger.info("Report Assembly Agent initialized")
     
+    @cached_property
+    def model(self):
+        """Gemini model, built on first use"""
+        return get_model(config.GEMINI_MODEL, self._generation_config)
+    
+    @cached_property
+    def extraction_agent(self) -> ExtractionAgent:
+        """Extraction sub-agent, created on first use"""
+        return ExtractionAgent()
+    
+    @cached_property
+    def summarization_agent(self) -> SummarizationAgent:
+        """Summarization sub-agent, created on first use"""
+        return SummarizationAgent()
+    
+    @cached_property
+    def pdf_generator(self) -> "PDFReportGenerator":
+        """PDF generator, created on first use; ReportLab is only imported once a report is built"""
+        from utils.pdf_generator import PDFReportGenerator
+        return PDFReportGenerator()
+    
     def generate_report(
         self,
         title: str,
@@ -54,35 +64,21 @@ class ReportAssemblyAgent:
         try:
             report_sections = []
             
-            # Generate each section
-            for section_name in sections:
-                logger.info(f"Generating section: {section_name}")
-                
-                if section_name == "Summary":
-                    # Use summarization agent
-                    summary = self.summarization_agent.generate_summary()
-                    report_sections.append({
-                        'title': section_name,
-                        'content': summary['content'],
-                        'type': 'text'
-                    })
-                else:
-                    # Extract section
-                    extracted = self.extraction_agent.extract_section(section_name)
-                    
-                    if extracted['found']:
-                        report_sections.append({
-                            'title': section_name,
-                            'content': extracted['content'],
-                            'type': 'text'
-                        })
-                    else:
-                        # Generate placeholder
-                        report_sections.append({
-                            'title': section_name,
-                            'content': f"No specific content found for {section_name} section.",
-                            'type': 'text'
-                        })
+            # Create the needed sub-agents up front so worker threads don't race to build them
+            if "Summary" in sections:
+                _ = self.summarization_agent
+            if any(section_name != "Summary" for section_name in sections):
+                _ = self.extraction_agent
+            
+            # Generate sections concurrently; results keep the requested order
+            if sections:
+                max_workers = min(config.REPORT_SECTION_WORKERS, len(sections))
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    futures = [
+                        executor.submit(self._generate_section, section_name)
+                        for section_name in sections
+                    ]
+                    report_sections = [future.result() for future in futures]
             
             # Create PDF
             report_data = {
@@ -113,3 +109,41 @@ class ReportAssemblyAgent:
                 'success': False,
                 'error': str(e)
             }
+    
+    def _generate_section(self, section_name: str) -> Dict[str, Any]:
+        """
+        Generate content for a single report section
+        
+        Args:
+            section_name: Name of the section
+            
+        Returns:
+            Section dictionary for the PDF generator
+        """
+        logger.info(f"Generating section: {section_name}")
+        
+        if section_name == "Summary":
+            # Use summarization agent
+            summary = self.summarization_agent.generate_summary()
+            return {
+                'title': section_name,
+                'content': summary['content'],
+                'type': 'text'
+            }
+        
+        # Extract section
+        extracted = self.extraction_agent.extract_section(section_name)
+        
+        if extracted['found']:
+            return {
+                'title': section_name,
+                'content': extracted['content'],
+                'type': 'text'
+            }
+        
+        # Generate placeholder
+        return {
+            'title': section_name,
+            'content': f"No specific content found for {section_name} section.",
+            'type': 'text'
+        }
@@ -1,38 +1,61 @@
 """
 Summarization Agent - Creates summaries of document content
 """
-import time
-from typing import Dict, Any
-from pathlib import Path
-import sys
-sys.path.append(str(Path(__file__).parent.parent))
+from functools import cached_property
+from typing import Dict, Any, List
 
-import google.generativeai as genai
-from utils.vector_store import VectorStore
+from utils.vector_store import get_vector_store, unique_contents, chunk_digest
+from utils.cached_vector_store import CachedVectorStore
+from utils.rate_limiter import gemini_bucket
+from utils.gemini import get_model
 from loguru import logger
 import config
 
 
+SUMMARY_TEMPLATE = """You are a medical documentation specialist. Create a concise professional summary of the following medical document content.
+
+Instructions:
+- Focus on key findings, clinical data, and important information
+- Keep the summary to approximately {max_length} words
+- Use professional medical terminology
+- Organize information clearly
+- Highlight the most important points
+
+Content to summarize:
+{content}
+
+Summary:"""
+
+SECTION_SUMMARY_TEMPLATE = """Summarize the following medical document section concisely:
+
+{content}
+
+Summary:"""
+
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) computed locally"""
+    return len(text) // 4 + 1
+
+
 class SummarizationAgent:
     """Agent for generating summaries"""
     
     def __init__(self):
-        # Configure Gemini
-        genai.configure(api_key=config.GOOGLE_API_KEY)
+        self._generation_config = "summary"
         
-        self.model = genai.GenerativeModel(
-            model_name=config.GEMINI_MODEL,
-            generation_config={
-                "temperature": 0.3,  # Lower temperature for more focused summaries
-                "top_p": 0.8,
-                "max_output_tokens": config.MAX_OUTPUT_TOKENS,
-            }
-        )
+        self.vector_store = CachedVectorStore(get_vector_store())
         
-        self.vector_store = VectorStore()
+        # Token counts of previously seen texts, keyed by content digest
+        self._token_counts: Dict[str, int] = {}
         
         logger.info("Summarization Agent initialized")
     
+    @cached_property
+    def model(self):
+        """Gemini model, built on first use"""
+        return get_model(config.GEMINI_MODEL, self._generation_config)
+    
     def generate_summary(self, max_length: int = 500) -> Dict[str, Any]:
         """
         Generate a summary of all uploaded documents
@@ -44,8 +67,6 @@ class SummarizationAgent:
             Summary content
         """
         try:
-            time.sleep(config.REQUEST_DELAY_SECONDS)
-            
             # Get sample content from documents
             results = self.vector_store.similarity_search(
                 query="main findings clinical data patient information key results",
@@ -58,29 +79,22 @@ class SummarizationAgent:
                     'success': False
                 }
             
-            # Combine content
-            content_parts = []
-            for result in results:
-                content_parts.append(result['content'])
+            # Combine as much distinct content as fits the token budget
+            content_parts = self._fit_token_budget(
+                [result['content'] for result in unique_contents(results)],
+                config.SUMMARY_INPUT_TOKEN_BUDGET
+            )
             
             combined_content = '\n\n'.join(content_parts)
             
             # Create summarization prompt
-            prompt = f"""You are a medical documentation specialist. Create a concise professional summary of the following medical document content.
-
-Instructions:
-- Focus on key findings, clinical data, and important information
-- Keep the summary to approximately {max_length} words
-- Use professional medical terminology
-- Organize information clearly
-- Highlight the most important points
-
-Content to summarize:
-{combined_content[:15000]}  # Limit to avoid token overflow
-
-Summary:"""
+            prompt = SUMMARY_TEMPLATE.format_map({
+                "max_length": max_length,
+                "content": combined_content,
+            })
             
-            # Generate summary
+            # Generate summary (rate limited)
+            gemini_bucket.acquire()
             response = self.model.generate_content(prompt)
             summary = response.text
             
@@ -97,6 +111,58 @@ Summary:"""
                 'success': False
             }
     
+    def _count_tokens(self, text: str) -> int:
+        """Count tokens with the model tokenizer, falling back to a ~4 chars/token estimate"""
+        key = chunk_digest(text)
+        if key not in self._token_counts:
+            try:
+                # count_tokens is a network call and draws on the same quota
+                gemini_bucket.acquire()
+                count = self.model.count_tokens(text).total_tokens
+            except Exception as e:
+                logger.warning(f"Token counting failed, estimating instead: {e}")
+                count = _estimate_tokens(text)
+            # Keep the cache from growing without bound
+            if len(self._token_counts) >= 4096:
+                self._token_counts.clear()
+            self._token_counts[key] = count
+        return self._token_counts[key]
+    
+    def _fit_token_budget(self, parts: List[str], budget: int) -> List[str]:
+        """
+        Keep leading parts whose combined token count stays within budget
+        
+        Args:
+            parts: Text parts in priority order
+            budget: Maximum number of tokens
+            
+        Returns:
+            Parts that fit (always at least the first one)
+        """
+        combined = '\n\n'.join(parts)
+        estimate = _estimate_tokens(combined)
+        
+        # Well under budget the local estimate is enough; no tokenizer call
+        if estimate <= budget * config.TOKEN_ESTIMATE_MARGIN:
+            return parts
+        
+        # Near the budget, one exact count decides
+        total = self._count_tokens(combined)
+        if total <= budget:
+            return parts
+        
+        # Otherwise accumulate per part, scaling local estimates by the measured ratio
+        ratio = total / estimate
+        kept = []
+        used = 0
+        for part in parts:
+            part_tokens = int(_estimate_tokens(part) * ratio) + 1
+            if kept and used + part_tokens > budget:
+                break
+            kept.append(part)
+            used += part_tokens
+        return kept
+    
     def summarize_section(self, section_content: str) -> str:
         """
         Summarize a specific section
@@ -108,14 +174,11 @@ Summary:"""
             Summarized content
         """
         try:
-            time.sleep(config.REQUEST_DELAY_SECONDS)
-            
-            prompt = f"""Summarize the following medical document section concisely:
-
-{section_content[:10000]}
-
-Summary:"""
+            prompt = SECTION_SUMMARY_TEMPLATE.format_map({
+                "content": section_content[:10000],
+            })
             
+            gemini_bucket.acquire()
             response = self.model.generate_content(prompt)
             return response.text
             
@@ -5,8 +5,14 @@ import streamlit as st
 import os
 from pathlib import Path
 import sys
+import shutil
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # Load environment variables
 load_dotenv()
@@ -17,6 +23,7 @@ sys.path.append(str(Path(__file__).parent))
 from agents.orchestrator import OrchestratorAgent
 from agents.extraction_agent import ExtractionAgent
 from agents.report_assembly_agent import ReportAssemblyAgent
+from utils.document_processor import parse_file
 import config
 
 # Page configuration
@@ -26,50 +33,17 @@ st.set_page_config(
     layout=config.LAYOUT
 )
 
-# Custom CSS
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 2.5rem;
-        font-weight: bold;
-        color: #1f77b4;
-        text-align: center;
-        padding: 1rem 0;
-    }
-    .upload-section {
-        background-color: #f0f2f6;
-        padding: 1.5rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-    }
-    .chat-message {
-        padding: 1rem;
-        border-radius: 0.5rem;
-        margin-bottom: 1rem;
-    }
-    .user-message {
-        background-color: #e3f2fd;
-    }
-    .assistant-message {
-        background-color: #f5f5f5;
-    }
-    .stButton>button {
-        width: 100%;
-    }
-</style>
-""", unsafe_allow_html=True)
+
+@st.cache_data(show_spinner=False)
+def load_css():
+    """Custom CSS, read from disk once"""
+    return (Path(__file__).parent / "assets" / "styles.css").read_text(encoding="utf-8")
 
 
 def initialize_session_state():
     """Initialize Streamlit session state variables"""
-    if 'orchestrator' not in st.session_state:
-        st.session_state.orchestrator = None
-    
-    if 'extraction_agent' not in st.session_state:
-        st.session_state.extraction_agent = None
-    
-    if 'report_agent' not in st.session_state:
-        st.session_state.report_agent = None
+    if 'agents_ready' not in st.session_state:
+        st.session_state.agents_ready = False
     
     if 'chat_history' not in st.session_state:
         st.session_state.chat_history = []
@@ -77,6 +51,9 @@ def initialize_session_state():
     if 'uploaded_files' not in st.session_state:
         st.session_state.uploaded_files = []
     
+    if 'doc_hashes' not in st.session_state:
+        st.session_state.doc_hashes = set()
+    
     if 'documents_loaded' not in st.session_state:
         st.session_state.documents_loaded = False
     
@@ -102,14 +79,39 @@ def check_api_key():
     return True
 
 
+@st.cache_resource(show_spinner=False)
+def get_orchestrator():
+    """Orchestrator shared by all sessions"""
+    return OrchestratorAgent()
+
+
+@st.cache_resource(show_spinner=False)
+def get_extraction_agent():
+    """Extraction agent shared by all sessions"""
+    return ExtractionAgent()
+
+
+@st.cache_resource(show_spinner=False)
+def get_report_agent():
+    """Report assembly agent shared by all sessions"""
+    return ReportAssemblyAgent()
+
+
+@st.cache_resource(show_spinner=False)
+def get_documents_lock():
+    """Serializes changes to the shared document collection across sessions"""
+    return threading.Lock()
+
+
 def initialize_agents():
     """Initialize all agents"""
     try:
-        if st.session_state.orchestrator is None:
+        if not st.session_state.agents_ready:
             with st.spinner("Initializing AI agents..."):
-                st.session_state.orchestrator = OrchestratorAgent()
-                st.session_state.extraction_agent = ExtractionAgent()
-                st.session_state.report_agent = ReportAssemblyAgent()
+                get_orchestrator()
+                get_extraction_agent()
+                get_report_agent()
+            st.session_state.agents_ready = True
             st.success("✅ AI agents initialized successfully!")
         return True
     except Exception as e:
@@ -117,51 +119,149 @@ def initialize_agents():
         return False
 
 
+@st.cache_data(max_entries=128, show_spinner=False)
+def cached_process(file_path, file_hash):
+    """Parse a document in the shared worker pool; file_hash is the real cache key, so re-uploads are free"""
+    return parse_file(file_path)
+
+
+def parse_documents(uploads):
+    """Parse (file path, content hash) pairs concurrently, reusing cached results"""
+    processed_docs = []
+    failed = []
+    
+    # Threads only wait on the cache or the process pool; they carry this run's context for st.cache_data
+    with ThreadPoolExecutor(
+        max_workers=min(config.INGEST_MAX_PROCESSES, len(uploads)),
+        initializer=add_script_run_ctx,
+        initargs=(None, get_script_run_ctx())
+    ) as executor:
+        futures = [
+            (file_path, executor.submit(cached_process, file_path, file_hash))
+            for file_path, file_hash in uploads
+        ]
+        # Collect in submission order so documents are indexed in upload order
+        for file_path, future in futures:
+            try:
+                processed_docs.append((file_path, future.result()))
+            except Exception as e:
+                failed.append({'file': file_path, 'error': str(e)})
+    
+    return processed_docs, failed
+
+
+class _HashingWriter:
+    """File wrapper that hashes the bytes written through it"""
+    
+    def __init__(self, f):
+        self._f = f
+        self._hash = hashlib.blake2b(digest_size=16)
+    
+    def write(self, data):
+        self._hash.update(data)
+        return self._f.write(data)
+    
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
 def handle_file_upload(uploaded_files):
     """Handle document upload and processing"""
     if not uploaded_files:
         return
     
     # Save uploaded files
-    saved_paths = []
+    uploads = []
     
+    # Create uploads directory if it doesn't exist
+    os.makedirs(config.UPLOADS_DIR, exist_ok=True)
+    
+    pending_hashes = set()
+    skipped = []
+    filenames = {}
     for uploaded_file in uploaded_files:
-        # Create uploads directory if it doesn't exist
-        os.makedirs(config.UPLOADS_DIR, exist_ok=True)
-        
-        # Save file
-        file_path = os.path.join(config.UPLOADS_DIR, uploaded_file.name)
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        
-        saved_paths.append(file_path)
+        # Stream file to a private temp file in 1 MiB chunks, hashing the bytes on the way
+        uploaded_file.seek(0)
+        fd, temp_path = tempfile.mkstemp(dir=config.UPLOADS_DIR, suffix=".part")
+        with os.fdopen(fd, "wb") as f:
+            writer = _HashingWriter(f)
+            shutil.copyfileobj(uploaded_file, writer, length=1 << 20)
+        file_hash = writer.hexdigest()
         
         if uploaded_file.name not in st.session_state.uploaded_files:
             st.session_state.uploaded_files.append(uploaded_file.name)
+        
+        # Identical content is already indexed (or queued), whatever its filename
+        if file_hash in st.session_state.doc_hashes or file_hash in pending_hashes:
+            os.remove(temp_path)
+            skipped.append(uploaded_file.name)
+            continue
+        
+        # Content-addressed path: another session uploading a same-named file can't overwrite it
+        file_path = os.path.join(config.UPLOADS_DIR, f"{file_hash}{Path(uploaded_file.name).suffix.lower()}")
+        os.replace(temp_path, file_path)
+        pending_hashes.add(file_hash)
+        filenames[file_path] = uploaded_file.name
+        uploads.append((file_path, file_hash))
+    
+    if skipped:
+        st.info(f"ℹ️ Already indexed, skipped: {', '.join(skipped)}")
+    if not uploads:
+        return
     
     # Process documents
+    doc_ids = dict(uploads)
     with st.spinner("Processing documents... This may take a moment."):
-        results = st.session_state.orchestrator.load_documents(saved_paths)
+        processed_docs, failed = parse_documents(uploads)
+        with get_documents_lock():
+            results = get_orchestrator().index_processed(processed_docs, failed, doc_ids, filenames)
+    st.session_state.doc_hashes.update(doc_ids[path] for path in results.success)
     
     # Display results
-    if results['success']:
-        st.success(f"✅ Successfully processed {len(results['success'])} documents!")
+    if results.success:
+        st.success(f"✅ Successfully processed {len(results.success)} documents!")
         st.session_state.documents_loaded = True
         
         # Show details
         with st.expander("📊 Processing Details"):
-            st.write(f"**Total chunks created:** {results['total_chunks']}")
-            for doc in results['processed_docs']:
-                st.write(f"- {doc['filename']}: {doc['chunks']} chunks")
+            st.write(f"**Total chunks created:** {results.total_chunks}")
+            for doc in results.processed_docs:
+                line = f"- {doc['filename']}: {doc['chunks']} chunks"
+                if doc['duplicate_chunks']:
+                    line += f" ({doc['duplicate_chunks']} already indexed, skipped)"
+                st.write(line)
     
-    if results['failed']:
-        st.error(f"❌ Failed to process {len(results['failed'])} documents")
-        for failed in results['failed']:
-            st.write(f"- {failed['file']}: {failed['error']}")
+    if results.failed:
+        st.error(f"❌ Failed to process {len(results.failed)} documents")
+        for failed in results.failed:
+            st.write(f"- {filenames.get(failed['file'], failed['file'])}: {failed['error']}")
+
 
+def bounded_history(chat_history):
+    """
+    Newest chat messages (at most CHAT_HISTORY_MAXLEN) that fit the prompt budget left after retrieved context
+    
+    Args:
+        chat_history: Session chat messages, oldest first
+        
+    Returns:
+        List of the most recent messages, oldest first
+    """
+    budget = config.MAX_INPUT_TOKENS - config.CHUNK_SIZE * config.TOP_K_RESULTS
+    used = 0
+    kept = []
+    for message in reversed(chat_history):
+        used += len(message['content']) // 4  # Rough token estimate
+        if used > budget or len(kept) >= config.CHAT_HISTORY_MAXLEN:
+            break
+        kept.append(message)
+    kept.reverse()
+    return kept
 
+
+@st.fragment
 def display_chat_interface():
-    """Display chat interface"""
+    """Display chat interface (a fragment: chat turns rerun only this function)"""
     st.subheader("💬 Chat with Your Documents")
     
     # Display chat history
@@ -198,16 +298,23 @@ def display_chat_interface():
         with st.chat_message("user"):
             st.write(prompt)
         
-        # Get response from orchestrator
+        # Stream response from orchestrator
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = st.session_state.orchestrator.process_request(
+            response = {}
+            
+            def stream_response():
+                for item in get_orchestrator().process_request_stream(
                     user_input=prompt,
-                    chat_history=st.session_state.chat_history
-                )
+                    chat_history=bounded_history(st.session_state.chat_history)
+                ):
+                    # The final item carries the full response and sources
+                    if isinstance(item, dict):
+                        response.update(item)
+                    else:
+                        yield item
             
-            # Display response
-            st.write(response['content'])
+            # Display response as it is generated
+            st.write_stream(stream_response())
             
             # Add to history
             assistant_message = {
@@ -226,8 +333,9 @@ def display_chat_interface():
             st.session_state.chat_history.append(assistant_message)
 
 
+@st.fragment
 def display_report_generation():
-    """Display report generation interface"""
+    """Display report generation interface (a fragment: its widgets rerun only this function)"""
     st.subheader("📄 Generate Medical Report")
     
     if not st.session_state.documents_loaded:
@@ -256,7 +364,7 @@ def display_report_generation():
         with st.spinner("Generating report... This may take a minute."):
             try:
                 # Generate report
-                report_data = st.session_state.report_agent.generate_report(
+                report_data = get_report_agent().generate_report(
                     title=report_title,
                     sections=sections
                 )
@@ -293,6 +401,9 @@ def display_report_generation():
 
 def main():
     """Main application"""
+    # Custom CSS
+    st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
+    
     initialize_session_state()
     
     # Header
@@ -340,13 +451,14 @@ def main():
         
         # Clear documents button
         if st.button("🗑️ Clear All Documents"):
-            if st.session_state.orchestrator:
-                st.session_state.orchestrator.clear_documents()
-                st.session_state.uploaded_files = []
-                st.session_state.chat_history = []
-                st.session_state.documents_loaded = False
-                st.success("✅ All documents cleared!")
-                st.rerun()
+            with get_documents_lock():
+                get_orchestrator().clear_documents()
+            st.session_state.uploaded_files = []
+            st.session_state.doc_hashes = set()
+            st.session_state.chat_history = []
+            st.session_state.documents_loaded = False
+            st.success("✅ All documents cleared!")
+            st.rerun()
     
     # Main content area
     tab1, tab2, tab3 = st.tabs(["💬 Chat", "📄 Generate Report", "ℹ️ About"])
@@ -24,20 +24,32 @@ EMBEDDING_MODEL = "models/text-embedding-004"  # Google's embedding model
 # Alternative: Use sentence-transformers for fully local embeddings
 USE_LOCAL_EMBEDDINGS = True
 LOCAL_EMBEDDING_MODEL = "all-MiniLM-L6-v2"  # Small, fast, free
+EMBEDDING_BATCH_SIZE = 64  # Texts per forward pass when embedding locally
+EMBEDDING_DEVICE = "auto"  # "auto" (CUDA when available), "cuda" or "cpu"; CUDA runs in fp16
+INGEST_BATCH_SIZE = 256  # Chunks embedded and written to the vector store per batch
 
 # Vector Store Configuration
 VECTOR_STORE_TYPE = "chroma"  # Using ChromaDB (free and open-source)
 COLLECTION_NAME = "medical_documents"
+CHROMA_MEMORY_LIMIT_BYTES = 1 << 30  # Loaded HNSW segments per process, evicted LRU beyond this
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
+EMBEDDING_CACHE_PATH = DATA_DIR / "embedding_cache.sqlite3"  # Reused chunk embeddings
+EMBEDDING_CACHE_INT8 = False  # Store cached embeddings as int8 (4x smaller, slightly lossy)
 
 # Document Processing Configuration
 MAX_FILE_SIZE_MB = 50
 SUPPORTED_EXTENSIONS = ['.pdf', '.docx', '.doc', '.xlsx', '.xls', '.png', '.jpg', '.jpeg']
+INGEST_MAX_PROCESSES = 8  # Worker processes for parsing uploads (capped by CPU count)
+OCR_MAX_SIDE = 1600  # Images are downscaled to this long side (px) before OCR
+OCR_CONFIG = "--oem 1 --psm 6"  # Tesseract LSTM engine, single uniform text block
 
 # RAG Configuration
 TOP_K_RESULTS = 5
 SIMILARITY_THRESHOLD = 0.7
+QA_CACHE_SIZE = 512  # Max cached answers for repeated questions
+RETRIEVAL_CACHE_SIZE = 5000  # Max cached similarity search results
+QUERY_EMBEDDING_CACHE_SIZE = 1024  # Max cached query embeddings
 
 # Agent Configuration
 MAX_AGENT_ITERATIONS = 5
@@ -47,8 +59,10 @@ AGENT_TIMEOUT_SECONDS = 60
 PAGE_TITLE = "Medical Document AI Assistant"
 PAGE_ICON = "🏥"
 LAYOUT = "wide"
+CHAT_HISTORY_MAXLEN = 20  # Most recent chat messages sent with each question (all are displayed)
 
 # PDF Report Configuration
+REPORT_SECTION_WORKERS = 8  # Max report sections generated concurrently
 REPORT_TEMPLATE = {
     "page_size": "A4",
     "margin": 72,  # 1 inch
@@ -61,7 +75,26 @@ REPORT_TEMPLATE = {
 # Gemini 2.0 Flash free tier: ~1M tokens per minute, 15 RPM
 MAX_INPUT_TOKENS = 30000  # Conservative limit per request
 MAX_OUTPUT_TOKENS = 8000
-REQUEST_DELAY_SECONDS = 4  # To stay under 15 RPM
+SUMMARY_INPUT_TOKEN_BUDGET = 20000  # Retrieved content allowed in a summary prompt
+TOKEN_ESTIMATE_MARGIN = 0.8  # Below this share of a budget, trust the ~4 chars/token estimate over count_tokens
+
+# Generation settings, keyed by the agents that share them
+GENERATION_CONFIGS = {
+    "default": None,
+    "qa": {
+        "temperature": 0.7,
+        "top_p": 0.95,
+        "top_k": 40,
+        "max_output_tokens": MAX_OUTPUT_TOKENS,
+    },
+    "summary": {
+        "temperature": 0.3,  # Lower temperature for more focused summaries
+        "top_p": 0.8,
+        "max_output_tokens": MAX_OUTPUT_TOKENS,
+    },
+}
+REQUESTS_PER_MINUTE = 15  # Gemini free-tier quota; burst plus refill never exceeds this in any minute
+REQUEST_BURST = 3  # Requests allowed back-to-back before throttling kicks in
 
 # Logging Configuration
 LOG_LEVEL = "INFO"
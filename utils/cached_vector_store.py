@@ -0,0 +1,84 @@
+"""
+LRU cache over vector store similarity searches
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+from loguru import logger
+import config
+from utils.vector_store import VectorStore
+
+
+class CachedVectorStore:
+    """Wrap a VectorStore and memoize similarity search results"""
+    
+    def __init__(self, vector_store: VectorStore, capacity: int = None):
+        self._store = vector_store
+        self._capacity = capacity or config.RETRIEVAL_CACHE_SIZE
+        self._model_name = vector_store.embedding_model_name
+        self._cache: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._generation = VectorStore.generation
+        self._lock = threading.Lock()
+    
+    def __getattr__(self, name):
+        # Delegate everything that isn't cached to the wrapped store
+        return getattr(self._store, name)
+    
+    def _cache_key(self, query: str, k: Optional[int], filter_dict: Optional[Dict]) -> str:
+        """Hash model, query, k and filters into a cache key"""
+        filter_key = json.dumps(filter_dict, sort_keys=True, default=str) if filter_dict else ""
+        raw = "\0".join([self._model_name, query, str(k), filter_key])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    
+    def similarity_search(
+        self,
+        query: str,
+        k: int = None,
+        filter_dict: Optional[Dict] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Search for similar documents, serving repeated queries from cache
+        
+        Args:
+            query: Search query
+            k: Number of results to return
+            filter_dict: Metadata filters
+            
+        Returns:
+            List of matching documents with scores
+        """
+        key = self._cache_key(query, k, filter_dict)
+        
+        with self._lock:
+            # Drop everything if the collection changed since we cached
+            if self._generation != VectorStore.generation:
+                self._cache.clear()
+                self._generation = VectorStore.generation
+            
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return list(cached)
+            generation = self._generation
+        
+        # Embed + search outside the lock
+        results = self._store.similarity_search(query=query, k=k, filter_dict=filter_dict)
+        
+        # Empty results may come from a failed search, don't cache them
+        if results:
+            with self._lock:
+                if generation == VectorStore.generation:
+                    self._cache[key] = list(results)
+                    self._cache.move_to_end(key)
+                    while len(self._cache) > self._capacity:
+                        self._cache.popitem(last=False)
+        
+        return results
+    
+    def clear_cache(self):
+        """Drop all cached search results"""
+        with self._lock:
+            self._cache.clear()
+        logger.info("Retrieval cache cleared")
@@ -3,31 +3,153 @@ Utility functions for document processing across multiple formats
 """
 import os
 import io
+import tarfile
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, TYPE_CHECKING
 import tempfile
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
 
-# PDF Processing
-import PyPDF2
-import fitz  # PyMuPDF
+from loguru import logger
+import config
 
-# Word Documents
-from docx import Document
+if TYPE_CHECKING:
+    import pandas as pd
 
-# Excel
-import pandas as pd
 
-# Images
-from PIL import Image
-import pytesseract
+# Extractor libraries are imported on first use so sessions that never
+# upload a given format don't pay for loading it
+@lru_cache(maxsize=1)
+def _get_fitz():
+    import fitz  # PyMuPDF
+    return fitz
 
-from loguru import logger
-import config
+
+@lru_cache(maxsize=1)
+def _get_docx():
+    from docx import Document
+    return Document
+
+
+@lru_cache(maxsize=1)
+def _get_openpyxl():
+    import openpyxl
+    return openpyxl
+
+
+@lru_cache(maxsize=1)
+def _get_pandas():
+    import pandas as pd
+    return pd
+
+
+@lru_cache(maxsize=1)
+def _get_pil_image():
+    from PIL import Image
+    return Image
+
+
+@lru_cache(maxsize=1)
+def _get_pytesseract():
+    import pytesseract
+    return pytesseract
+
+
+def _prepare_for_ocr(img):
+    """Convert to grayscale and cap the long side; Tesseract cost scales with pixel count"""
+    img = img.convert("L")
+    width, height = img.size
+    scale = config.OCR_MAX_SIDE / max(width, height)
+    if scale < 1:
+        img = img.resize((int(width * scale), int(height * scale)), _get_pil_image().BILINEAR)
+    return img
+
+
+def _iter_sheet_rows(excel_path: str):
+    """Yield (sheet name, list of row tuples) for each sheet of a workbook"""
+    if Path(excel_path).suffix.lower() == '.xls':
+        # openpyxl cannot read the legacy binary format
+        for sheet_name, df in _get_pandas().read_excel(excel_path, sheet_name=None, header=None).items():
+            yield sheet_name, list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+        return
+    
+    workbook = _get_openpyxl().load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        for sheet_name in workbook.sheetnames:
+            yield sheet_name, list(workbook[sheet_name].iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+
+def _write_image_bundle(archive_path: str, images: List[Tuple[str, bytes]]):
+    """Write (member name, data) pairs into one uncompressed tar archive"""
+    with tarfile.open(archive_path, "w") as archive:
+        for member_name, data in images:
+            info = tarfile.TarInfo(name=member_name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+
+def _table_rows(tbl) -> List[List[str]]:
+    """
+    Cell texts of a Word table read from its XML, laid out like row.cells:
+    spanned cells repeat per grid column and vertical merges carry down
+    """
+    rows = []
+    above = {}  # Grid offset -> text in the previous row
+    for tr in tbl.tr_lst:
+        row = []
+        current = {}
+        offset = tr.grid_before
+        for tc in tr.tc_lst:
+            if tc.vMerge == "continue":
+                text = above.get(offset, '')
+            else:
+                text = '\n'.join(p.text for p in tc.p_lst)
+            for _ in range(tc.grid_span):
+                current[offset] = text
+                offset += 1
+                row.append(text)
+        rows.append(row)
+        above = current
+    return rows
+
+
+def _has_ruling_lines(page, min_lines: int = 2) -> bool:
+    """
+    Cheap pre-check for find_tables: its default "lines" strategy needs
+    at least two horizontal rules (or rectangle edges) on the page
+    """
+    horizontal = 0
+    for path in page.get_cdrawings():
+        for item in path.get('items', ()):
+            if item[0] == 're':
+                horizontal += 2  # Top and bottom edge
+            elif item[0] == 'l' and abs(item[1][1] - item[2][1]) < 1:
+                horizontal += 1
+            if horizontal >= min_lines:
+                return True
+    return False
 
 
 class DocumentProcessor:
     """Handle multi-format document processing"""
     
+    # File extension -> extraction method
+    _DISPATCH = {
+        '.pdf': 'process_pdf',
+        '.docx': 'process_word',
+        '.doc': 'process_word',
+        '.xlsx': 'process_excel',
+        '.xls': 'process_excel',
+        '.png': 'process_image',
+        '.jpg': 'process_image',
+        '.jpeg': 'process_image'
+    }
+    
     def __init__(self):
         self.supported_formats = config.SUPPORTED_EXTENSIONS
         
@@ -43,30 +165,59 @@ class DocumentProcessor:
         """
         file_ext = Path(file_path).suffix.lower()
         
-        if file_ext == '.pdf':
-            return self.process_pdf(file_path)
-        elif file_ext in ['.docx', '.doc']:
-            return self.process_word(file_path)
-        elif file_ext in ['.xlsx', '.xls']:
-            return self.process_excel(file_path)
-        elif file_ext in ['.png', '.jpg', '.jpeg']:
-            return self.process_image(file_path)
-        else:
+        method_name = self._DISPATCH.get(file_ext)
+        if method_name is None:
             raise ValueError(f"Unsupported file format: {file_ext}")
+        return getattr(self, method_name)(file_path)
     
-    def process_pdf(self, pdf_path: str) -> Dict[str, Any]:
-        """Extract text, tables, and images from PDF"""
+    def process_documents(self, file_paths: List[str]) -> Dict[str, Any]:
+        """
+        Process several documents concurrently in the shared parse pool
+        
+        Args:
+            file_paths: Paths to the document files
+            
+        Returns:
+            Dictionary keyed by path, in input order; failed documents map to the exception raised
+        """
+        # Threads only wait on the process pool, which does the CPU-bound work
+        with ThreadPoolExecutor(max_workers=min(config.INGEST_MAX_PROCESSES, len(file_paths) or 1)) as executor:
+            futures = [(path, executor.submit(parse_file, path)) for path in file_paths]
+            results = {}
+            for path, future in futures:
+                try:
+                    results[path] = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to process {path}: {e}")
+                    results[path] = e
+        
+        return results
+    
+    def process_pdf(self, pdf_path: str, extract_images: bool = False) -> Dict[str, Any]:
+        """
+        Extract text, tables, and images from PDF
+        
+        Args:
+            pdf_path: Path to the PDF file
+            extract_images: Decode embedded images and bundle them into one tar
+                archive in UPLOADS_DIR; otherwise only their page and xref are recorded
+            
+        Returns:
+            Dictionary containing extracted content
+        """
         result = {
             'text': [],
             'tables': [],
             'images': [],
             'metadata': {}
         }
+        pending_images = []
+        archive_path = os.path.join(config.UPLOADS_DIR, f"{Path(pdf_path).stem}.images.tar")
         
         doc = None
         try:
             # Use PyMuPDF for comprehensive extraction
-            doc = fitz.open(pdf_path)
+            doc = _get_fitz().open(pdf_path)
             
             # Store page count before closing
             num_pages = len(doc)
@@ -74,53 +225,54 @@ class DocumentProcessor:
             
             for page_num, page in enumerate(doc):
                 try:
-                    # Extract text
-                    text = page.get_text()
-                    if text.strip():
-                        result['text'].append({
-                            'page': page_num + 1,
-                            'content': text
-                        })
+                    # Extract text as layout blocks: (x0, y0, x1, y1, text, block_no, block_type)
+                    for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks"):
+                        if block_type == 0 and text.strip():
+                            result['text'].append({
+                                'page': page_num + 1,
+                                'content': text,
+                                'bbox': (x0, y0, x1, y1)
+                            })
                 except Exception as text_err:
                     logger.warning(f"Failed to extract text on page {page_num + 1}: {text_err}")
                 
                 try:
-                    # Extract images
-                    image_list = page.get_images()
+                    # Extract images (listing xrefs is cheap; decoding and writing is opt-in)
+                    image_list = page.get_images(full=False)
                     for img_index, img in enumerate(image_list):
                         xref = img[0]
+                        if not extract_images:
+                            result['images'].append({
+                                'page': page_num + 1,
+                                'xref': xref
+                            })
+                            continue
+                        
                         base_image = doc.extract_image(xref)
-                        image_bytes = base_image["image"]
                         image_ext = base_image["ext"]
                         
-                        # Save image to temp location
-                        temp_img_path = os.path.join(
-                            config.UPLOADS_DIR,
-                            f"extracted_img_p{page_num+1}_{img_index}.{image_ext}"
-                        )
-                        
-                        with open(temp_img_path, "wb") as img_file:
-                            img_file.write(image_bytes)
+                        # Bundle images into one archive per PDF (written after the page loop)
+                        member_name = f"extracted_img_p{page_num+1}_{img_index}.{image_ext}"
+                        pending_images.append((member_name, base_image["image"]))
                         
                         result['images'].append({
                             'page': page_num + 1,
-                            'path': temp_img_path,
+                            'archive': archive_path,
+                            'member': member_name,
                             'format': image_ext
                         })
                 except Exception as img_err:
                     logger.warning(f"Failed to extract images on page {page_num + 1}: {img_err}")
                 
-                # Extract tables (basic detection)
+                # Extract tables (basic detection), skipping pages without ruled lines
                 try:
-                    tables = page.find_tables()
+                    tables = page.find_tables() if _has_ruling_lines(page) else None
                     if tables:
                         for table_index, table in enumerate(tables):
                             try:
-                                df = table.to_pandas()
                                 result['tables'].append({
                                     'page': page_num + 1,
-                                    'data': df.to_dict('records'),
-                                    'dataframe': df
+                                    'data': table.to_pandas().to_dict('records')
                                 })
                             except Exception as table_err:
                                 logger.warning(f"Failed to extract table {table_index} on page {page_num + 1}: {table_err}")
@@ -128,6 +280,10 @@ class DocumentProcessor:
                 except Exception as tables_err:
                     logger.warning(f"Failed to find tables on page {page_num + 1}: {tables_err}")
             
+            # One file for all of this PDF's images instead of one per image
+            if pending_images:
+                _write_image_bundle(archive_path, pending_images)
+            
             # Metadata (use stored page count)
             result['metadata'] = {
                 'filename': Path(pdf_path).name,
@@ -155,33 +311,27 @@ class DocumentProcessor:
         }
         
         try:
+            Document = _get_docx()
             doc = Document(docx_path)
             
-            # Extract paragraphs
-            full_text = []
-            for para in doc.paragraphs:
-                if para.text.strip():
-                    full_text.append(para.text)
+            # Extract paragraphs (each paragraph's text is built once)
+            full_text = [text for text in (para.text for para in doc.paragraphs) if text.strip()]
             
             result['text'].append({
                 'page': 1,
                 'content': '\n'.join(full_text)
             })
             
-            # Extract tables
+            # Extract tables straight from the XML; _Cell.text re-walks runs per access
             for table_index, table in enumerate(doc.tables):
-                data = []
-                for row in table.rows:
-                    row_data = [cell.text for cell in row.cells]
-                    data.append(row_data)
+                data = _table_rows(table._tbl)
                 
-                # Convert to DataFrame
+                # Store as records; rebuild a DataFrame with table_to_df when needed
                 if data:
-                    df = pd.DataFrame(data[1:], columns=data[0])
+                    header, *body = data
                     result['tables'].append({
                         'index': table_index,
-                        'data': df.to_dict('records'),
-                        'dataframe': df
+                        'data': [dict(zip(header, row)) for row in body]
                     })
             
             # Extract images (from document parts)
@@ -221,30 +371,33 @@ class DocumentProcessor:
         }
         
         try:
-            # Read all sheets
-            excel_file = pd.ExcelFile(excel_path)
-            
-            for sheet_name in excel_file.sheet_names:
-                df = pd.read_excel(excel_path, sheet_name=sheet_name)
+            # Stream every sheet once; no per-sheet archive re-parse, no style objects
+            num_sheets = 0
+            for sheet_name, rows in _iter_sheet_rows(excel_path):
+                num_sheets += 1
                 
                 # Convert to text representation
-                text_repr = f"Sheet: {sheet_name}\n" + df.to_string()
+                text_repr = f"Sheet: {sheet_name}\n" + "\n".join(
+                    "\t".join("" if value is None else str(value) for value in row)
+                    for row in rows
+                )
                 result['text'].append({
                     'sheet': sheet_name,
                     'content': text_repr
                 })
                 
-                # Store as table
-                result['tables'].append({
-                    'sheet': sheet_name,
-                    'data': df.to_dict('records'),
-                    'dataframe': df
-                })
+                # Store as table (first row is the header)
+                if rows:
+                    header, *body = rows
+                    result['tables'].append({
+                        'sheet': sheet_name,
+                        'data': [dict(zip(header, row)) for row in body]
+                    })
             
             result['metadata'] = {
                 'filename': Path(excel_path).name,
                 'format': 'EXCEL',
-                'num_sheets': len(excel_file.sheet_names)
+                'num_sheets': num_sheets
             }
             
         except Exception as e:
@@ -264,18 +417,18 @@ class DocumentProcessor:
         
         try:
             # Open image
-            img = Image.open(image_path)
+            img = _get_pil_image().open(image_path)
+            width, height = img.size
             
-            # Perform OCR
-            text = pytesseract.image_to_string(img)
+            # Perform OCR (LSTM engine, single text block) on a grayscale, downscaled copy
+            text = _get_pytesseract().image_to_string(_prepare_for_ocr(img), config=config.OCR_CONFIG)
             
             if text.strip():
                 result['text'].append({
                     'content': text
                 })
             
-            # Convert tuple to string for ChromaDB compatibility
-            width, height = img.size
+            # Convert tuple to string for ChromaDB compatibility (original dimensions)
             result['metadata'] = {
                 'filename': Path(image_path).name,
                 'format': 'IMAGE',
@@ -290,11 +443,115 @@ class DocumentProcessor:
         
         return result
     
-    def extract_all_text(self, processed_doc: Dict[str, Any]) -> str:
-        """Combine all text from processed document"""
-        all_text = []
+    def extract_all_text(self, processed_doc: Dict[str, Any], structured: bool = False):
+        """
+        Combine all text from processed document
+        
+        Args:
+            processed_doc: Output of process_document
+            structured: Return chunk candidates instead of one string; consecutive
+                text entries (e.g. PDF layout blocks) are packed up to CHUNK_SIZE
+            
+        Returns:
+            Combined text, or when structured is True a list of chunk candidates,
+            each {'content', 'page_start', 'page_end'} (page keys only when known)
+        """
+        if not structured:
+            return '\n\n'.join(text_item.get('content', '') for text_item in processed_doc.get('text', []))
         
+        chunks = []
+        current = None
         for text_item in processed_doc.get('text', []):
-            all_text.append(text_item.get('content', ''))
+            text = text_item.get('content', '').strip()
+            if not text:
+                continue
+            page = text_item.get('page')
+            if current and len(current['content']) + len(text) + 2 > config.CHUNK_SIZE:
+                chunks.append(current)
+                current = None
+            if current is None:
+                current = {'content': text}
+                if page is not None:
+                    current['page_start'] = current['page_end'] = page
+            else:
+                current['content'] = f"{current['content']}\n\n{text}"
+                if page is not None:
+                    current.setdefault('page_start', page)
+                    current['page_end'] = page
+        if current:
+            chunks.append(current)
         
-        return '\n\n'.join(all_text)
+        return chunks
+
+
+def table_to_df(entry: Dict[str, Any]) -> "pd.DataFrame":
+    """
+    Rebuild a DataFrame from an extracted table entry
+    
+    Args:
+        entry: Table entry from a processed document's 'tables' list
+        
+    Returns:
+        DataFrame built from the entry's records
+    """
+    return _get_pandas().DataFrame.from_records(entry['data'])
+
+
+def process_file(file_path: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Process one document; module-level so it can run in a worker process
+    
+    Args:
+        file_path: Path to the document file
+        
+    Returns:
+        (file_path, processed document) pair
+    """
+    return file_path, DocumentProcessor().process_document(file_path)
+
+
+_parse_pool_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def get_parse_pool() -> ProcessPoolExecutor:
+    """Worker processes for parsing documents (parsing and OCR are CPU bound), shared process-wide"""
+    # Spawn (not fork) so workers don't inherit the host app's threads and sockets
+    return ProcessPoolExecutor(
+        max_workers=min(config.INGEST_MAX_PROCESSES, os.cpu_count() or 1),
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def _replace_broken_pool(broken: ProcessPoolExecutor):
+    """Drop a broken pool so the next get_parse_pool() builds a fresh one"""
+    with _parse_pool_lock:
+        # Another thread may already have replaced it
+        if get_parse_pool() is broken:
+            get_parse_pool.cache_clear()
+    broken.shutdown(wait=False)
+
+
+def parse_file(file_path: str) -> Dict[str, Any]:
+    """
+    Process one document in the shared parse pool
+    
+    Args:
+        file_path: Path to the document file
+        
+    Returns:
+        Processed document
+    """
+    pool = get_parse_pool()
+    try:
+        return pool.submit(process_file, file_path).result()[1]
+    except BrokenProcessPool:
+        # A crashed worker breaks the pool for good, failing every file in flight;
+        # later calls get a fresh shared pool
+        logger.warning(f"Parse pool broke while processing {file_path}; restarting it")
+        _replace_broken_pool(pool)
+    
+    # Retry once in a throwaway single-worker pool, so a file that crashes its
+    # worker fails on its own instead of breaking the other files' retries
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as solo:
+        return solo.submit(process_file, file_path).result()[1]
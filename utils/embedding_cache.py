@@ -0,0 +1,100 @@
+"""
+Persistent cache of chunk embeddings backed by SQLite
+"""
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from loguru import logger
+import config
+
+
+def embedding_key(text: str, model_name: str) -> bytes:
+    """Content hash identifying an embedding of text by a given model"""
+    return hashlib.sha256(f"{model_name}\0{text}".encode('utf-8')).digest()
+
+
+def quantize_int8(vec) -> bytes:
+    """Symmetric per-vector int8 quantization, packed as float32 scale + int8 values"""
+    vec = np.asarray(vec, dtype=np.float32)
+    max_abs = float(np.max(np.abs(vec))) if vec.size else 0.0
+    scale = max_abs / 127 if max_abs > 0 else 1.0
+    quantized = np.round(vec / scale).astype(np.int8)
+    return np.float32(scale).tobytes() + quantized.tobytes()
+
+
+def dequantize_int8(blob: bytes) -> np.ndarray:
+    """Inverse of quantize_int8"""
+    scale = np.frombuffer(blob[:4], dtype=np.float32)[0]
+    return np.frombuffer(blob[4:], dtype=np.int8).astype(np.float32) * scale
+
+
+class EmbeddingCache:
+    """Map content hashes to embedding vectors (float32, or int8 when enabled)"""
+    
+    def __init__(self, db_path: str = None, int8: bool = None):
+        self.db_path = str(db_path or config.EMBEDDING_CACHE_PATH)
+        self.int8 = config.EMBEDDING_CACHE_INT8 if int8 is None else int8
+        # Quantized vectors live in their own table so toggling the flag is safe
+        self._table = "embeddings_int8" if self.int8 else "embeddings"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self._table} (hash BLOB PRIMARY KEY, vec BLOB NOT NULL)"
+        )
+        self._conn.commit()
+        logger.info(f"Embedding cache opened: {self.db_path}")
+    
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        """Return the cached vector for a hash, or None"""
+        return self.get_many([key]).get(key)
+    
+    def put(self, key: bytes, vec) -> None:
+        """Store a single vector"""
+        self.put_many({key: vec})
+    
+    def get_many(self, keys: Iterable[bytes]) -> Dict[bytes, np.ndarray]:
+        """Return cached vectors for every hash that is present"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT hash, vec FROM {self._table} WHERE hash IN ({placeholders})",
+                    batch
+                ).fetchall()
+            for key, blob in rows:
+                if self.int8:
+                    found[bytes(key)] = dequantize_int8(blob)
+                else:
+                    found[bytes(key)] = np.frombuffer(blob, dtype=np.float32)
+        return found
+    
+    def put_many(self, vectors: Dict[bytes, List[float]]) -> None:
+        """Persist vectors keyed by content hash"""
+        rows = [(key, self._encode(vec)) for key, vec in vectors.items()]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self._table} (hash, vec) VALUES (?, ?)",
+                rows
+            )
+            self._conn.commit()
+    
+    def _encode(self, vec) -> bytes:
+        """Serialize a vector in the configured storage format"""
+        if self.int8:
+            return quantize_int8(vec)
+        return np.asarray(vec, dtype=np.float32).tobytes()
+    
+    def close(self):
+        """Close the underlying connection"""
+        with self._lock:
+            self._conn.close()
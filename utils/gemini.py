@@ -0,0 +1,24 @@
+"""
+Shared Google Gemini model instances
+"""
+from functools import lru_cache
+import google.generativeai as genai
+import config
+
+
+@lru_cache(maxsize=None)
+def get_model(model_name: str, config_key: str = "default") -> genai.GenerativeModel:
+    """
+    Get the shared GenerativeModel for a model and named generation config
+    
+    Args:
+        model_name: Gemini model name
+        config_key: Key into config.GENERATION_CONFIGS
+        
+    Returns:
+        GenerativeModel instance, created once per (model_name, config_key)
+    """
+    return genai.GenerativeModel(
+        model_name=model_name,
+        generation_config=config.GENERATION_CONFIGS[config_key]
+    )
@@ -10,28 +10,59 @@ from reportlab.platypus import (
     Table, TableStyle, Image as RLImage, KeepTogether
 )
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
+from PIL import Image as PILImage
+import io
+import os
+import re
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any
-import pandas as pd
+from typing import List, Dict, Any, BinaryIO, Union, TYPE_CHECKING
 from loguru import logger
 import config
 
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# Resolution images are resampled to when scaled down to fit the page
+IMAGE_DPI = 150
+
+# Runs of non-blank lines, i.e. paragraphs separated by blank lines
+_PARAGRAPH = re.compile(r'\S[^\n]*(?:\n(?!\n)[^\n]*)*')
+
 
 class PDFReportGenerator:
     """Generate structured PDF reports"""
     
+    # Stylesheet shared by every generator; built once, then only read
+    _cached_styles = None
+    _styles_lock = threading.Lock()
+    
     def __init__(self):
-        self.styles = getSampleStyleSheet()
-        self._setup_custom_styles()
+        self.styles = self._get_styles()
+    
+    @classmethod
+    def _get_styles(cls):
+        """Get the shared stylesheet, building it on first use"""
+        if cls._cached_styles is None:
+            with cls._styles_lock:
+                if cls._cached_styles is None:
+                    styles = getSampleStyleSheet()
+                    cls._setup_custom_styles(styles)
+                    cls._cached_styles = styles
+        return cls._cached_styles
     
-    def _setup_custom_styles(self):
+    @staticmethod
+    def _setup_custom_styles(styles):
         """Setup custom paragraph styles"""
         # Title style
-        if 'CustomTitle' not in self.styles:
-            self.styles.add(ParagraphStyle(
+        if 'CustomTitle' not in styles:
+            styles.add(ParagraphStyle(
                 name='CustomTitle',
-                parent=self.styles['Heading1'],
+                parent=styles['Heading1'],
                 fontSize=18,
                 textColor=colors.HexColor('#1a1a1a'),
                 spaceAfter=30,
@@ -40,10 +71,10 @@ class PDFReportGenerator:
             ))
         
         # Section heading style
-        if 'SectionHeading' not in self.styles:
-            self.styles.add(ParagraphStyle(
+        if 'SectionHeading' not in styles:
+            styles.add(ParagraphStyle(
                 name='SectionHeading',
-                parent=self.styles['Heading2'],
+                parent=styles['Heading2'],
                 fontSize=14,
                 textColor=colors.HexColor('#2c3e50'),
                 spaceBefore=20,
@@ -52,10 +83,10 @@ class PDFReportGenerator:
             ))
         
         # Body text style - use a custom name to avoid conflict
-        if 'CustomBodyText' not in self.styles:
-            self.styles.add(ParagraphStyle(
+        if 'CustomBodyText' not in styles:
+            styles.add(ParagraphStyle(
                 name='CustomBodyText',
-                parent=self.styles['BodyText'],
+                parent=styles['BodyText'],
                 fontSize=11,
                 leading=16,
                 alignment=TA_JUSTIFY,
@@ -65,29 +96,20 @@ class PDFReportGenerator:
     def generate_report(
         self,
         report_data: Dict[str, Any],
-        output_path: str
-    ) -> str:
+        output_path: Union[str, BinaryIO]
+    ) -> Union[str, BinaryIO]:
         """
         Generate a PDF report from structured data
         
         Args:
             report_data: Dictionary containing report sections
-            output_path: Path to save the PDF
+            output_path: Path to save the PDF, or a binary file-like object
+                (e.g. BytesIO) to write it to without touching disk
             
         Returns:
-            Path to generated PDF
+            Path to generated PDF (or the file-like object passed in)
         """
         try:
-            # Create PDF document
-            doc = SimpleDocTemplate(
-                output_path,
-                pagesize=A4,
-                rightMargin=config.REPORT_TEMPLATE['margin'],
-                leftMargin=config.REPORT_TEMPLATE['margin'],
-                topMargin=config.REPORT_TEMPLATE['margin'],
-                bottomMargin=config.REPORT_TEMPLATE['margin']
-            )
-            
             # Build story (content)
             story = []
             
@@ -116,11 +138,12 @@ class PDFReportGenerator:
                 
                 # Add section content based on type
                 if section_type == 'text':
-                    # Regular text paragraph
-                    paragraphs = section_content.split('\n\n')
-                    for para in paragraphs:
-                        if para.strip():
-                            story.append(Paragraph(para, self.styles['CustomBodyText']))
+                    # Regular text: one flowable per section, paragraphs separated by blank lines
+                    combined = '<br/><br/>'.join(
+                        match.group(0) for match in _PARAGRAPH.finditer(section_content)
+                    )
+                    if combined:
+                        story.append(Paragraph(combined, self.styles['CustomBodyText']))
                     story.append(Spacer(1, 0.3*inch))
                 
                 elif section_type == 'table':
@@ -138,17 +161,27 @@ class PDFReportGenerator:
                         story.append(Spacer(1, 0.3*inch))
                 
                 elif section_type == 'list':
-                    # Bullet points
-                    items = section_content.split('\n')
-                    for item in items:
-                        if item.strip():
-                            bullet_text = f"• {item.strip()}"
-                            story.append(Paragraph(bullet_text, self.styles['CustomBodyText']))
+                    # Bullet points, one flowable per list
+                    items = section_content.splitlines()
+                    combined = '<br/>'.join(f"• {item.strip()}" for item in items if item.strip())
+                    if combined:
+                        story.append(Paragraph(combined, self.styles['CustomBodyText']))
                     story.append(Spacer(1, 0.3*inch))
             
-            # Build PDF
-            doc.build(story)
-            logger.info(f"PDF report generated: {output_path}")
+            # Build PDF straight into the destination (ReportLab writes it in one go at the end)
+            if isinstance(output_path, (str, os.PathLike)):
+                try:
+                    with open(output_path, 'wb') as fh:
+                        self._build(fh, story)
+                except Exception:
+                    # Don't leave an empty or truncated PDF behind
+                    if os.path.exists(output_path):
+                        os.remove(output_path)
+                    raise
+                logger.info(f"PDF report generated: {output_path}")
+            else:
+                self._build(output_path, story)
+                logger.info("PDF report generated in memory")
             
             return output_path
             
@@ -156,6 +189,46 @@ class PDFReportGenerator:
             logger.error(f"Error generating PDF: {e}")
             raise
     
+    def _build(self, fh: BinaryIO, story: List[Any]):
+        """Lay out the story and write the PDF to an open binary file"""
+        doc = SimpleDocTemplate(
+            fh,
+            pagesize=A4,
+            rightMargin=config.REPORT_TEMPLATE['margin'],
+            leftMargin=config.REPORT_TEMPLATE['margin'],
+            topMargin=config.REPORT_TEMPLATE['margin'],
+            bottomMargin=config.REPORT_TEMPLATE['margin']
+        )
+        doc.build(story)
+    
+    def generate_reports(
+        self,
+        report_datas: List[Dict[str, Any]],
+        output_paths: List[str]
+    ) -> List[str]:
+        """
+        Generate several PDF reports in parallel worker processes
+        
+        Args:
+            report_datas: Report dictionaries, as for generate_report
+            output_paths: Where to save each report
+            
+        Returns:
+            Paths to the generated PDFs, in input order
+        """
+        if len(report_datas) != len(output_paths):
+            raise ValueError("report_datas and output_paths must have the same length")
+        if not report_datas:
+            return []
+        
+        max_workers = min(os.cpu_count() or 1, len(report_datas))
+        # Spawn (not fork) so workers don't inherit the host app's threads
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            return list(executor.map(_build_one, report_datas, output_paths))
+    
     def _create_table(self, data: List[List[Any]]) -> Table:
         """Create a formatted table"""
         # Create table
@@ -190,30 +263,47 @@ class PDFReportGenerator:
     def _create_image(self, image_path: str, max_width: float = 5*inch) -> RLImage:
         """Create an image element"""
         try:
-            img = RLImage(image_path)
-            
-            # Scale image if needed
-            if img.drawWidth > max_width:
-                aspect = img.drawHeight / img.drawWidth
-                img.drawWidth = max_width
-                img.drawHeight = max_width * aspect
+            # Pillow reads only the header here; images that already fit are
+            # embedded from the original file, untouched
+            with PILImage.open(image_path) as im:
+                width, height = im.size  # ReportLab's default: 1 px = 1 pt
+                if width <= max_width:
+                    return RLImage(image_path, width=width, height=height)
+                
+                # Oversize images are downsampled to IMAGE_DPI at their drawn width
+                # so ReportLab embeds the smaller buffer
+                fmt = 'JPEG' if im.format == 'JPEG' else 'PNG'
+                draw_width = max_width
+                draw_height = max_width * height / width
+                im.thumbnail((int(max_width * IMAGE_DPI / inch), 10_000), PILImage.LANCZOS)
+                
+                if fmt == 'PNG' and im.mode not in ('1', 'L', 'LA', 'P', 'RGB', 'RGBA', 'I'):
+                    im = im.convert('RGB')
+                buf = io.BytesIO()
+                im.save(buf, format=fmt, quality=90)  # quality only applies to JPEG
+                buf.seek(0)
             
-            return img
+            return RLImage(buf, width=draw_width, height=draw_height)
         except Exception as e:
             logger.error(f"Error creating image: {e}")
             return Paragraph(f"[Image could not be loaded: {image_path}]", self.styles['Normal'])
     
-    def dataframe_to_table_data(self, df: pd.DataFrame) -> List[List[str]]:
+    def dataframe_to_table_data(self, df: "pd.DataFrame") -> List[List[str]]:
         """Convert pandas DataFrame to table data"""
         # Get headers
-        headers = list(df.columns)
-        
-        # Get data rows
-        data_rows = df.values.tolist()
+        headers = [str(h) for h in df.columns]
         
-        # Convert all to strings
-        table_data = [[str(h) for h in headers]]
-        for row in data_rows:
-            table_data.append([str(cell) for cell in row])
+        # Convert all cells to strings in one vectorized pass
+        body = df.astype(str).to_numpy().tolist()
         
-        return table_data
+        return [headers] + body
+
+
+def _build_one(report_data: Dict[str, Any], output_path: str) -> str:
+    """
+    Build one report in a worker process
+    
+    The stylesheet isn't picklable, so each worker builds its own generator
+    instead of receiving the caller's.
+    """
+    return PDFReportGenerator().generate_report(report_data, output_path)
@@ -0,0 +1,47 @@
+"""
+Token bucket rate limiting for Gemini API calls
+"""
+import threading
+import time
+import config
+
+
+class TokenBucket:
+    """Thread-safe token bucket: callers proceed immediately while tokens remain"""
+    
+    def __init__(self, rate_per_sec: float, burst: int = 1):
+        self.rate = rate_per_sec
+        self.capacity = float(burst)
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._cond = threading.Condition()
+    
+    def _refill(self):
+        """Add tokens accrued since the last refill"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+    
+    def acquire(self, tokens: float = 1.0):
+        """
+        Take tokens from the bucket, blocking only until enough have accrued
+        
+        Args:
+            tokens: Number of tokens to consume
+        """
+        with self._cond:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                # Releases the lock while waiting so other callers can queue up
+                self._cond.wait(timeout=(tokens - self._tokens) / self.rate)
+
+
+# Shared by every agent so concurrent requests draw from one quota; the refill
+# rate leaves room for the burst so no 60 s window exceeds REQUESTS_PER_MINUTE
+gemini_bucket = TokenBucket(
+    rate_per_sec=(config.REQUESTS_PER_MINUTE - config.REQUEST_BURST) / 60,
+    burst=config.REQUEST_BURST
+)
@@ -1,14 +1,24 @@
 """
 Vector store operations using ChromaDB
 """
-from typing import List, Dict, Any, Optional
-import chromadb
-from chromadb.config import Settings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
+import hashlib
+import threading
+import uuid
+from functools import lru_cache
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple, Union
+import numpy as np
 from loguru import logger
 import config
+from utils.embedding_cache import EmbeddingCache, embedding_key
+
+
+class BatchAddResult(NamedTuple):
+    """Outcome of add_document_batch, one entry per input document"""
+    chunk_ids: List[List[str]]
+    duplicate_chunks: List[int]
+
+
+_ALLOWED_METADATA_TYPES = frozenset({str, int, float, bool})
 
 
 def _filter_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
@@ -18,7 +28,8 @@ def _filter_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
     """
     filtered = {}
     for key, value in metadata.items():
-        if isinstance(value, (str, int, float, bool)):
+        # Exact-type set lookup covers almost every value; subclasses fall through
+        if type(value) in _ALLOWED_METADATA_TYPES or isinstance(value, (str, int, float, bool)):
             filtered[key] = value
         elif isinstance(value, (list, tuple, dict)):
             # Skip complex types
@@ -32,19 +43,73 @@ def _filter_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
     return filtered
 
 
+def chunk_digest(text: str) -> str:
+    """Content hash identifying a chunk across ingests"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _embedding_model_kwargs() -> Dict[str, Any]:
+    """SentenceTransformer arguments for config.EMBEDDING_DEVICE (fp16 weights on CUDA)"""
+    import torch
+    
+    device = config.EMBEDDING_DEVICE
+    if device == "auto":
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    
+    if device == "cuda":
+        return {'device': device, 'model_kwargs': {'torch_dtype': torch.float16}}
+    return {'device': device}
+
+
+def unique_contents(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Drop search results whose content repeats an earlier result
+    (e.g. boilerplate headers repeated across medical PDFs)
+    """
+    seen = set()
+    unique = []
+    for result in results:
+        content_hash = hash(result['content'])
+        if content_hash in seen:
+            continue
+        seen.add(content_hash)
+        unique.append(result)
+    return unique
+
+
 class VectorStore:
     """Manage vector database operations"""
     
+    # Bumped on every write so caches over search results can detect staleness
+    generation = 0
+    
     def __init__(self):
+        # Chroma and LangChain are imported here, when the store is first built,
+        # so importing this module (e.g. for unique_contents) stays cheap
+        import chromadb
+        from chromadb.config import Settings
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        
         self.collection_name = config.COLLECTION_NAME
         self.persist_directory = str(config.VECTOR_DB_DIR)
         
+        # Guards the Chroma client, which is shared by every agent and worker thread
+        self._lock = threading.RLock()
+        
         # Initialize embeddings
+        self.embedding_model_name = (
+            config.LOCAL_EMBEDDING_MODEL if config.USE_LOCAL_EMBEDDINGS
+            else config.EMBEDDING_MODEL
+        )
         if config.USE_LOCAL_EMBEDDINGS:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
             self.embeddings = HuggingFaceEmbeddings(
                 model_name=config.LOCAL_EMBEDDING_MODEL,
-                model_kwargs={'device': 'cpu'},
-                encode_kwargs={'normalize_embeddings': True}
+                model_kwargs=_embedding_model_kwargs(),
+                encode_kwargs={
+                    'normalize_embeddings': True,
+                    'batch_size': config.EMBEDDING_BATCH_SIZE
+                }
             )
         else:
             from langchain_google_genai import GoogleGenerativeAIEmbeddings
@@ -53,6 +118,24 @@ class VectorStore:
                 google_api_key=config.GOOGLE_API_KEY
             )
         
+        # Chunk embeddings already computed in earlier ingests
+        self.embedding_cache = EmbeddingCache()
+        
+        # Query embeddings for repeated questions (per instance, so the cache dies with the store)
+        self._embed_query_cached = lru_cache(maxsize=config.QUERY_EMBEDDING_CACHE_SIZE)(self._embed_query)
+        
+        # One persistent client for the store's lifetime; clearing reuses it.
+        # Loaded index segments are LRU-evicted past the memory limit, so each
+        # worker process's resident index stays bounded
+        self._client = chromadb.PersistentClient(
+            path=self.persist_directory,
+            settings=Settings(
+                anonymized_telemetry=False,
+                chroma_segment_cache_policy="LRU",
+                chroma_memory_limit_bytes=config.CHROMA_MEMORY_LIMIT_BYTES
+            )
+        )
+        
         # Initialize vector store
         self.vectorstore = None
         self._initialize_vectorstore()
@@ -66,11 +149,16 @@ class VectorStore:
     
     def _initialize_vectorstore(self):
         """Initialize or load existing vector store"""
+        from langchain_community.vectorstores import Chroma
+        
         try:
+            # Embeddings are unit-normalized, so inner product ranks like cosine with less work
+            # (applies when the collection is created; existing collections keep their space)
             self.vectorstore = Chroma(
+                client=self._client,
                 collection_name=self.collection_name,
                 embedding_function=self.embeddings,
-                persist_directory=self.persist_directory
+                collection_metadata={"hnsw:space": "ip"}
             )
             logger.info("Vector store initialized successfully")
         except Exception as e:
@@ -87,41 +175,201 @@ class VectorStore:
         Returns:
             List of document IDs
         """
+        return [chunk_id for doc_ids in self.add_document_batch(documents).chunk_ids for chunk_id in doc_ids]
+    
+    def add_document_batch(self, documents: List[Dict[str, Any]]) -> BatchAddResult:
+        """
+        Add documents to the vector store, embedding and storing chunks in batches
+        
+        Args:
+            documents: List of document dictionaries with 'metadata' and either
+                'text' or pre-segmented 'chunks' (strings, or dicts with 'content'
+                and optional 'page_start'/'page_end' copied into chunk metadata);
+                chunk IDs are "{doc_id}-{i}", and an optional stable 'doc_id'
+                (e.g. a file hash) keeps them deterministic
+            
+        Returns:
+            Stored chunk IDs for each document, in input order, and per document
+            the number of chunks skipped because their content was already
+            stored (in this call or earlier)
+        """
         try:
-            # Prepare documents for ingestion
-            texts = []
-            metadatas = []
+            grouped_ids = [[] for _ in documents]
+            duplicate_counts = [0] * len(documents)
+            seen_hashes = set()
+            
+            # Chunks are embedded and stored in fixed-size batches so peak
+            # memory is bounded by the batch, not the whole ingest
+            batch_owners = []
+            batch_ids = []
+            batch_texts = []
+            batch_metadatas = []
             
-            for doc in documents:
-                # Split text into chunks
-                chunks = self.text_splitter.split_text(doc['text'])
+            for doc_index, doc in enumerate(documents):
+                # Split text into chunks; pre-segmented pieces are only re-split when oversize
+                if doc.get('chunks') is not None:
+                    chunks = self._split_oversize(doc['chunks'])
+                else:
+                    chunks = [(text, {}) for text in self.text_splitter.split_text(doc['text'])]
+                
+                # One random id per document without a stable one; chunks are numbered under it
+                doc_id = doc.get('doc_id') or uuid.uuid4().hex
                 
-                for chunk in chunks:
-                    texts.append(chunk)
-                    # Prepare metadata and filter out complex types
-                    base_metadata = {
-                        'filename': doc.get('filename', 'unknown'),
-                        'source': doc.get('source', 'uploaded'),
-                        'doc_type': doc.get('doc_type', 'medical'),
-                        **doc.get('metadata', {})
-                    }
-                    # Filter complex metadata (tuples, lists, dicts, etc.)
-                    filtered_metadata = _filter_metadata(base_metadata)
-                    metadatas.append(filtered_metadata)
+                # Prepare metadata once per document and filter out complex types
+                base_metadata = {
+                    'filename': doc.get('filename', 'unknown'),
+                    'source': doc.get('source', 'uploaded'),
+                    'doc_type': doc.get('doc_type', 'medical'),
+                    **doc.get('metadata', {})
+                }
+                # Filter complex metadata (tuples, lists, dicts, etc.)
+                filtered_metadata = _filter_metadata(base_metadata)
+                
+                for i, (chunk, chunk_metadata) in enumerate(chunks):
+                    # Repeated boilerplate (headers, disclaimers) is embedded and stored once
+                    chunk_hash = chunk_digest(chunk)
+                    if chunk_hash in seen_hashes:
+                        duplicate_counts[doc_index] += 1
+                        continue
+                    seen_hashes.add(chunk_hash)
+                    
+                    batch_owners.append(doc_index)
+                    batch_ids.append(f"{doc_id}-{i}")
+                    batch_texts.append(chunk)
+                    batch_metadatas.append({**filtered_metadata, **chunk_metadata, 'chunk_hash': chunk_hash})
+                    
+                    if len(batch_texts) >= config.INGEST_BATCH_SIZE:
+                        self._flush_batch(grouped_ids, duplicate_counts, batch_owners, batch_ids, batch_texts, batch_metadatas)
+                        batch_owners, batch_ids, batch_texts, batch_metadatas = [], [], [], []
             
-            # Add to vector store
-            ids = self.vectorstore.add_texts(
-                texts=texts,
-                metadatas=metadatas
-            )
+            if batch_texts:
+                self._flush_batch(grouped_ids, duplicate_counts, batch_owners, batch_ids, batch_texts, batch_metadatas)
             
-            logger.info(f"Added {len(ids)} chunks to vector store")
-            return ids
+            logger.info(
+                f"Added {sum(len(ids) for ids in grouped_ids)} chunks to vector store, "
+                f"skipped {sum(duplicate_counts)} already stored"
+            )
+            return BatchAddResult(grouped_ids, duplicate_counts)
             
         except Exception as e:
             logger.error(f"Error adding documents: {e}")
             raise
     
+    def _flush_batch(
+        self,
+        grouped_ids: List[List[str]],
+        duplicate_counts: List[int],
+        owners: List[int],
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[Dict[str, Any]]
+    ):
+        """Store one batch, recording stored chunk IDs and skipped duplicates under their documents"""
+        owner_by_id = dict(zip(ids, owners))
+        stored = self._upsert_batch(ids, texts, metadatas)
+        for chunk_id in stored:
+            grouped_ids[owner_by_id[chunk_id]].append(chunk_id)
+        for chunk_id in set(ids).difference(stored):
+            duplicate_counts[owner_by_id[chunk_id]] += 1
+    
+    def _upsert_batch(
+        self,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[Dict[str, Any]]
+    ) -> List[str]:
+        """
+        Embed one batch of chunks and upsert it with precomputed embeddings,
+        skipping chunks whose content an earlier ingest already stored
+        
+        Returns:
+            IDs of the chunks that were stored
+        """
+        hashes = [metadata['chunk_hash'] for metadata in metadatas]
+        with self._lock:
+            existing = self.vectorstore._collection.get(
+                where={'chunk_hash': {'$in': hashes}},
+                include=['metadatas']
+            )
+        stored_hashes = {metadata['chunk_hash'] for metadata in existing['metadatas']}
+        if stored_hashes:
+            keep = [i for i, chunk_hash in enumerate(hashes) if chunk_hash not in stored_hashes]
+            ids = [ids[i] for i in keep]
+            texts = [texts[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+            if not ids:
+                return []
+        
+        # Embed only chunks not seen before; the batch's misses go to the model in one call
+        embeddings = self._embed_with_cache(texts)
+        
+        with self._lock:
+            self.vectorstore._collection.upsert(
+                ids=ids,
+                embeddings=embeddings,
+                documents=texts,
+                metadatas=metadatas
+            )
+            VectorStore.generation += 1
+        
+        return ids
+    
+    def _split_oversize(self, pieces: List[Union[str, Dict[str, Any]]]) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Keep pieces that already fit CHUNK_SIZE; run the splitter only on larger ones
+        
+        Args:
+            pieces: Chunk candidates, either text or {'content', ...} dicts whose
+                other keys (e.g. page_start/page_end) are chunk metadata
+            
+        Returns:
+            (chunk text, chunk metadata) pairs; split pieces share their parent's metadata
+        """
+        chunks = []
+        for piece in pieces:
+            if isinstance(piece, str):
+                text, extra = piece, {}
+            else:
+                extra = {key: value for key, value in piece.items() if key != 'content'}
+                text = piece['content']
+            if len(text) <= config.CHUNK_SIZE:
+                chunks.append((text, extra))
+            else:
+                chunks.extend((part, extra) for part in self.text_splitter.split_text(text))
+        return chunks
+    
+    def _embed_with_cache(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts, reusing cached vectors for previously seen chunks
+        
+        Args:
+            texts: Chunk texts to embed
+            
+        Returns:
+            One embedding per text, in input order
+        """
+        keys = [embedding_key(text, self.embedding_model_name) for text in texts]
+        cached = self.embedding_cache.get_many(keys)
+        
+        # Embed each distinct missing chunk once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        
+        if missing:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            new_entries = dict(zip(missing.keys(), new_vectors))
+            self.embedding_cache.put_many(new_entries)
+            cached.update(new_entries)
+        
+        logger.info(f"Embedded {len(missing)} new chunks, reused {len(texts) - len(missing)}")
+        return [np.asarray(cached[key], dtype=np.float32).tolist() for key in keys]
+    
+    def _embed_query(self, query: str) -> Tuple[float, ...]:
+        """Embed a search query; returned as a tuple so cached values can't be mutated"""
+        return tuple(self.embeddings.embed_query(query))
+    
     def similarity_search(
         self, 
         query: str, 
@@ -143,19 +391,28 @@ class VectorStore:
             k = config.TOP_K_RESULTS
         
         try:
-            # Perform similarity search with scores
-            results = self.vectorstore.similarity_search_with_score(
-                query=query,
-                k=k,
-                filter=filter_dict
-            )
+            # Embed the query (repeated questions skip the forward pass)
+            query_embedding = list(self._embed_query_cached(query))
+            
+            # Query the native collection so LangChain doesn't embed the query again
+            with self._lock:
+                results = self.vectorstore._collection.query(
+                    query_embeddings=[query_embedding],
+                    n_results=k,
+                    where=filter_dict,
+                    include=['documents', 'metadatas', 'distances']
+                )
             
             # Format results
             formatted_results = []
-            for doc, score in results:
+            for content, metadata, score in zip(
+                results['documents'][0],
+                results['metadatas'][0],
+                results['distances'][0]
+            ):
                 formatted_results.append({
-                    'content': doc.page_content,
-                    'metadata': doc.metadata,
+                    'content': content,
+                    'metadata': metadata or {},
                     'score': score
                 })
             
@@ -177,17 +434,18 @@ class VectorStore:
     def clear_collection(self):
         """Clear all documents from the collection"""
         try:
-            # Delete the collection
-            client = chromadb.PersistentClient(path=self.persist_directory)
-            try:
-                client.delete_collection(name=self.collection_name)
-                logger.info(f"Cleared collection: {self.collection_name}")
-            except:
-                pass
-            
-            # Reinitialize
-            self._initialize_vectorstore()
-            
+            with self._lock:
+                # Delete the collection
+                try:
+                    self._client.delete_collection(name=self.collection_name)
+                    logger.info(f"Cleared collection: {self.collection_name}")
+                except:
+                    pass
+                
+                # Reinitialize
+                self._initialize_vectorstore()
+                VectorStore.generation += 1
+                
         except Exception as e:
             logger.error(f"Error clearing collection: {e}")
             raise
@@ -195,8 +453,8 @@ class VectorStore:
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get statistics about the collection"""
         try:
-            collection = self.vectorstore._collection
-            count = collection.count()
+            with self._lock:
+                count = self.vectorstore._collection.count()
             
             return {
                 'document_count': count,
@@ -205,3 +463,17 @@ class VectorStore:
         except Exception as e:
             logger.error(f"Error getting stats: {e}")
             return {'document_count': 0, 'collection_name': self.collection_name}
+
+
+_singleton_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _create_vector_store() -> VectorStore:
+    return VectorStore()
+
+
+def get_vector_store() -> VectorStore:
+    """Get the process-wide VectorStore (one Chroma client and embedding model)"""
+    with _singleton_lock:
+        return _create_vector_store()